@@ -6,6 +6,87 @@ Created on Mon Jul 29 2024
 """
 
 import math
+from functools import wraps
+
+prange = range  # numba.prange once the kernels are compiled
+
+
+def njit(*args, **kwargs):
+    """
+    Lazy version of numba.njit: numba is only imported, and the function compiled or loaded from the cache, on its
+    first call, so importing this module stays fast for callers that never use the compiled functions. The compiled
+    function then replaces the decorated one in the module namespace. numba is optional, without it the function runs
+    as plain Python.
+
+    numba cannot call the lazy wrappers, so the functions a kernel calls are compiled before the kernel itself. The
+    same function can be compiled a second time with other options by decorating it again under another name.
+    """
+    def decorate(func, name=None):
+        name = name or func.__name__
+
+        def compile_now():
+            global prange
+            try:
+                import numba
+            except ImportError:
+                compiled = func
+            else:
+                prange = numba.prange
+                for called in func.__code__.co_names:
+                    getattr(globals().get(called), 'compile_now', lambda: None)()
+                compiled = numba.njit(*args, **kwargs)(func)
+            globals()[name] = compiled
+            return compiled
+
+        @wraps(func)
+        def first_call(*call_args):
+            return compile_now()(*call_args)
+        first_call.compile_now = compile_now
+        return first_call
+    return decorate
+
+
+_ONE_THIRD = 1.0 / 3.0  # exponent of the cube roots in the terminal velocity
+
+
+@njit('UniTuple(f8, 4)(f8, f8, f8, f8, f8, f8, f8, f8)', cache=True, nogil=True)
+def _separator_sizing(rho_vapor, rho_liquid, gas_flowrate, liquid_flowrate, viscosity_gas, h_d_ratio, D_sphere, liquid_fill):
+    """
+    Compiled implementation of gas_liquid_separator_sizing, see there for the parameters. It is compiled for float64
+    arguments on its first call, which does not allow default arguments, so all of them are required.
+    """
+    g = 9.81  # gravitational acceleration in m/s^2
+
+    # Calculate the terminal velocity 
+    D_stern = D_sphere * (rho_vapor * (rho_liquid - rho_vapor) * g / (viscosity_gas * viscosity_gas))**_ONE_THIRD
+    u_t_stern = 1 / (18 / (D_stern * D_stern) + 0.591 / math.sqrt(D_stern))
+    u_t = u_t_stern / (rho_vapor * rho_vapor / (viscosity_gas * (rho_liquid - rho_vapor) * g))**_ONE_THIRD
+
+    # Calculate the vessel diameter by setting gas velocity equal to terminal velocity
+    D_vessel = math.sqrt(4 * gas_flowrate / (math.pi * u_t))
+
+    # Calculate the cross-sectional area of the vessel
+    cross_section = 0.25 * math.pi * D_vessel * D_vessel
+
+    # The actual gas velocity equals the terminal velocity by construction of D_vessel
+    gas_velocity = u_t
+
+    # Calculate the length of the vessel based on the height-to-diameter ratio
+    D_length = h_d_ratio * D_vessel
+
+    # Calculate the volume of the vessel
+    D_volume = cross_section * D_length
+
+    # Calculate the hold-up time based on the volume of the reactor occupied by liquid (assuming 65% liquid volume)
+    hold_up_time = cross_section * (liquid_fill * D_length) / liquid_flowrate / 3600  # converted to hours
+
+    return D_vessel, D_volume, hold_up_time, gas_velocity
+
+
+# The batch samples follow NumPy's error handling, so that a sample with e.g. a zero flow rate gives inf or NaN instead of
+# aborting the whole batch with ZeroDivisionError. Without numba they are NumPy floats, which behave the same.
+# It is not cached, numba would store it in the same cache entry as _separator_sizing which has the other error model.
+_separator_sizing_sample = njit(error_model='numpy', nogil=True)(_separator_sizing.__wrapped__, '_separator_sizing_sample')
 
 
 def gas_liquid_separator_sizing(rho_vapor, rho_liquid, gas_flowrate, liquid_flowrate, viscosity_gas, h_d_ratio=3, D_sphere=0.0001, liquid_fill = 0.65):
@@ -30,6 +111,7 @@ def gas_liquid_separator_sizing(rho_vapor, rho_liquid, gas_flowrate, liquid_flow
     - D_volume: Volume of the vessel (m^3)
     - hold_up_time: Hold-up time (hours)
     - gas_velocity: Gas velocity in the vessel (m/s)
+    If any parameter is a NumPy array, the calculation is passed on to gas_liquid_separator_sizing_vec and arrays are returned.
 
     Theory and Calculations:
     1. Terminal Velocity: The terminal velocity of droplets is crucial to ensure that the droplet can settle
@@ -52,29 +134,46 @@ def gas_liquid_separator_sizing(rho_vapor, rho_liquid, gas_flowrate, liquid_flow
       still ensure efficient and effective separation.
 
     """
-    
-    g = 9.81  # gravitational acceleration in m/s^2
+    args = (rho_vapor, rho_liquid, gas_flowrate, liquid_flowrate, viscosity_gas, h_d_ratio, D_sphere, liquid_fill)
 
-    # Calculate the terminal velocity 
-    D_stern = D_sphere * (rho_vapor * (rho_liquid - rho_vapor) * g / viscosity_gas**2)**(1/3)
-    u_t_stern = (18 / D_stern**2 + 0.591 / D_stern**0.5)**-1
-    u_t = u_t_stern * (rho_vapor**2 / (viscosity_gas * (rho_liquid - rho_vapor) * g))**(-1/3)
+    # The compiled implementation only accepts scalars, size NumPy array inputs as a batch
+    if any(getattr(x, 'ndim', 0) > 0 for x in args):
+        return gas_liquid_separator_sizing_vec(*args)
 
-    # Calculate the vessel diameter by setting gas velocity equal to terminal velocity
-    D_vessel = (4 * gas_flowrate / (math.pi * u_t))**(1/2)
+    # 0-d arrays and NumPy scalars are passed on as plain floats
+    return _separator_sizing(*(float(x) for x in args))
 
-    # Calculate the actual gas velocity
-    gas_velocity = 4 * gas_flowrate / (math.pi * D_vessel**2)
 
-    # Calculate the length of the vessel based on the height-to-diameter ratio
-    D_length = h_d_ratio * D_vessel
+@njit('void(f8[::1], f8[::1], f8[::1], f8[::1], f8[::1], f8[::1], f8[::1], f8[::1], f8[:, ::1])', parallel=True, cache=True, nogil=True, error_model='numpy')
+def _separator_sizing_kernel(rho_vapor, rho_liquid, gas_flowrate, liquid_flowrate, viscosity_gas, h_d_ratio, D_sphere, liquid_fill, out):
+    for i in prange(out.shape[0]):
+        D_vessel, D_volume, hold_up_time, gas_velocity = _separator_sizing_sample(
+            rho_vapor[i], rho_liquid[i], gas_flowrate[i], liquid_flowrate[i], viscosity_gas[i], h_d_ratio[i], D_sphere[i], liquid_fill[i])
+        out[i, 0] = D_vessel
+        out[i, 1] = D_volume
+        out[i, 2] = hold_up_time
+        out[i, 3] = gas_velocity
 
-    # Calculate the volume of the vessel
-    D_volume = math.pi / 4 * D_vessel**2 * D_length
 
-    # Calculate the hold-up time based on the volume of the reactor occupied by liquid (assuming 65% liquid volume)
-    hold_up_time = (math.pi * (liquid_fill * D_length) * D_vessel**2 ) / (4 * liquid_flowrate) / 3600  # converted to hours
+def gas_liquid_separator_sizing_vec(rho_vapor, rho_liquid, gas_flowrate, liquid_flowrate, viscosity_gas, h_d_ratio=3, D_sphere=0.0001, liquid_fill = 0.65):
+    """
+    Size a batch of gas-liquid separators at once, e.g. for Monte-Carlo sampling of uncertain physical properties and flow rates.
 
-    return D_vessel, D_volume, hold_up_time, gas_velocity
+    Same as gas_liquid_separator_sizing, but all parameters may be NumPy arrays (or scalars) that broadcast against each other.
+    The samples are distributed over all CPU cores when numba is installed.
+
+    Returns:
+    - D_vessel, D_volume, hold_up_time, gas_velocity (ndarray): See gas_liquid_separator_sizing, with the broadcast shape of the inputs.
+    """
+    import numpy as np
+
+    args = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (rho_vapor, rho_liquid, gas_flowrate, liquid_flowrate, viscosity_gas, h_d_ratio, D_sphere, liquid_fill)))
+    shape = args[0].shape
+    args = [np.ascontiguousarray(x).ravel() for x in args]
+
+    out = np.empty((args[0].size, 4))
+    _separator_sizing_kernel(*args, out)
+
+    return tuple(out[:, k].reshape(shape) for k in range(4))
 
 
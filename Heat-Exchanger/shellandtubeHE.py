@@ -7,11 +7,41 @@ Created on Thu Jun  6 23:55:27 2024
 
 
 
-import numpy as np
 import math
+from functools import lru_cache, wraps
 
+prange = range  # numba.prange once the kernels are compiled
 
 
+def njit(*args, **kwargs):
+    """
+    Lazy version of numba.njit: numba is only imported, and the function compiled or loaded from the cache, on its
+    first call, so importing this module stays fast for callers that never use the compiled functions. The compiled
+    function then replaces the decorated one in the module namespace. numba is optional, without it the function runs
+    as plain Python.
+    """
+    def decorate(func):
+        @wraps(func)
+        def first_call(*call_args):
+            global prange
+            try:
+                import numba
+            except ImportError:
+                compiled = func
+            else:
+                prange = numba.prange
+                compiled = numba.njit(*args, **kwargs)(func)
+            globals()[func.__name__] = compiled
+            return compiled(*call_args)
+        return first_call
+    return decorate
+
+
+_PI_4 = 0.25 * math.pi  # cross-sectional area of a circle per squared diameter
+
+
+
+@lru_cache(maxsize=4096)
 def estimate_tube_number(heat_transfer_area, tube_outer_diameter, length, n, min_tubes=20):
     """
     Estimate the number of tubes required to achieve a specified heat transfer area with a given tube diameter and a fixed length.
@@ -31,7 +61,11 @@ def estimate_tube_number(heat_transfer_area, tube_outer_diameter, length, n, min
     tube_surface_area = tube_surface_area_per_meter * length  # Total surface area for the given length
 
     # Calculate the number of tubes needed to achieve the desired total heat transfer area
-    total = math.ceil(heat_transfer_area / tube_surface_area)
+    # (int() truncates, so round up whenever the ratio has a fractional part)
+    ratio = heat_transfer_area / tube_surface_area
+    total = int(ratio)
+    if total != ratio:
+        total += 1
 
     # Adjust the tube count based on specific requirements
     if total > 1 and total < min_tubes:
@@ -42,6 +76,38 @@ def estimate_tube_number(heat_transfer_area, tube_outer_diameter, length, n, min
     return total
 
 
+def estimate_tube_number_vec(heat_transfer_area, tube_outer_diameter, length, n, min_tubes=20):
+    """
+    Estimate the number of tubes for a whole set of candidate designs at once, e.g. a grid of tube lengths and diameters.
+
+    Same as estimate_tube_number, but all parameters may be NumPy arrays (or scalars) that broadcast against each other.
+
+    Parameters:
+    - heat_transfer_area (float or array): The total required heat transfer area (m^2).
+    - tube_outer_diameter (float or array): The outer diameter of the tubes (m).
+    - length (float or array): The fixed length of the tubes (m).
+    - n (int or array): Maximum allowable number of tubes.
+    - min_tubes (int or array): Minimum number of tubes typically needed for shell and tube heat exchangers, default is 20.
+
+    Returns:
+    - ndarray of int: The estimated total number of tubes for every candidate, 0 where the maximum allowable number of tubes is exceeded.
+    """
+    import numpy as np
+
+    # Calculate the surface area of one tube for the given length
+    tube_surface_area = np.pi * np.asarray(tube_outer_diameter) * length
+
+    # Calculate the number of tubes needed to achieve the desired total heat transfer area
+    total = np.ceil(heat_transfer_area / tube_surface_area).astype(int)
+
+    # Adjust the tube count based on specific requirements
+    total = np.where((total > 1) & (total < min_tubes), min_tubes, total)
+    total = np.where(total > n, 0, total)
+
+    return total
+
+
+@lru_cache(maxsize=4096)
 def calculate_baffle_spacing(shell_diameter, baffle_cut_percentage):
     """
     Estimate the number of baffles and their spacing according to Kern's method.
@@ -67,6 +133,43 @@ def calculate_baffle_spacing(shell_diameter, baffle_cut_percentage):
 
 
 
+# Pitch factors (pitch / tube outer diameter) of the supported pitch types
+_PITCH_FACTORS = {
+    't': 1.1,  # Typical for triangular pitch
+    's': 1.25,  # Typical for square pitch
+}
+
+
+def _make_shell_diameter_calc(pitch_factor):
+    """
+    Build the shell diameter calculation for one pitch type, with its pitch factor fixed as a constant.
+
+    Parameters:
+    pitch_factor (float): Ratio of the pitch to the tube outer diameter.
+
+    Returns:
+    function: calc(num_tubes, tube_outer_diameter, min_shell_diameter) returning the shell diameter (in meters).
+    """
+    def calc(num_tubes, tube_outer_diameter, min_shell_diameter):
+        # Calculate the pitch (center-to-center distance between tubes)
+        pitch = tube_outer_diameter * pitch_factor
+
+        # Calculate the approximate diameter of the tube bundle
+        tube_bundle_diameter = math.sqrt((num_tubes * pitch * pitch) / math.pi)
+
+        # Estimate the shell diameter (usually 30% larger than the tube bundle diameter)
+        shell_diameter = tube_bundle_diameter * 1.3
+
+        # Apply the minimum shell diameter rule
+        return max(shell_diameter, min_shell_diameter)
+
+    return calc
+
+
+_SHELL_DIAMETER_CALCS = {pitch_type: _make_shell_diameter_calc(pitch_factor) for pitch_type, pitch_factor in _PITCH_FACTORS.items()}
+
+
+@lru_cache(maxsize=4096)
 def calculate_shell_diameter(num_tubes, tube_outer_diameter, pitch_type='t', min_shell_diameter=0.15):
     """
     Calculates the shell diameter for a shell and tube heat exchanger, enforcing a minimum shell diameter.
@@ -80,25 +183,48 @@ def calculate_shell_diameter(num_tubes, tube_outer_diameter, pitch_type='t', min
     Returns:
     float: Shell diameter (in meters), adjusted for minimum size.
     """
+    # Select the calculation specialized for the pitch type
+    calc = _SHELL_DIAMETER_CALCS.get(pitch_type)
+    if calc is None:
+        raise ValueError("Invalid pitch type. Use 't' for triangular or 's' for square.")
+
+    return calc(num_tubes, tube_outer_diameter, min_shell_diameter)
+
+
+def calculate_shell_diameter_vec(num_tubes, tube_outer_diameter, pitch_type='t', min_shell_diameter=0.15):
+    """
+    Calculates the shell diameters for a whole set of candidate designs at once, enforcing a minimum shell diameter.
+
+    Same as calculate_shell_diameter, but all parameters may be NumPy arrays (or scalars) that broadcast against each other.
+
+    Parameters:
+    num_tubes (int or array): Number of tubes in the heat exchanger.
+    tube_outer_diameter (float or array): Outer diameter of each tube (in meters).
+    pitch_type (str or array of str): Type of pitch ('t' for triangular, 's' for square).
+    min_shell_diameter (float or array): Minimum shell diameter (in meters), default is 0.15 meters.
+
+    Returns:
+    ndarray: Shell diameters (in meters), adjusted for minimum size.
+    """
+    import numpy as np
+
     # Set the pitch factor based on the pitch type
-    if pitch_type == 't':
-        pitch_factor = 1.1  # Typical for triangular pitch
-    elif pitch_type == 's':
-        pitch_factor = 1.25  # Typical for square pitch
-    else:
+    pitch_type = np.asarray(pitch_type)
+    if not np.all((pitch_type == 't') | (pitch_type == 's')):
         raise ValueError("Invalid pitch type. Use 't' for triangular or 's' for square.")
+    pitch_factor = np.where(pitch_type == 't', _PITCH_FACTORS['t'], _PITCH_FACTORS['s'])
 
     # Calculate the pitch (center-to-center distance between tubes)
     pitch = tube_outer_diameter * pitch_factor
 
     # Calculate the approximate diameter of the tube bundle
-    tube_bundle_diameter = math.sqrt((num_tubes * pitch**2) / math.pi)
+    tube_bundle_diameter = np.sqrt((num_tubes * pitch * pitch) / np.pi)
 
     # Estimate the shell diameter (usually 30% larger than the tube bundle diameter)
     shell_diameter = tube_bundle_diameter * 1.3
 
     # Apply the minimum shell diameter rule
-    shell_diameter = max(shell_diameter, min_shell_diameter)
+    shell_diameter = np.maximum(shell_diameter, min_shell_diameter)
 
     return shell_diameter
 
@@ -124,11 +250,12 @@ def calculate_shelltubeexchanger_weight(shell_diameter, tube_length, tube_outer_
     """
     # Calculate shell volume
     shell_inner_diameter = shell_diameter - 2 * shell_thickness
-    shell_volume = math.pi * (shell_diameter**2 - shell_inner_diameter**2) / 4 * tube_length
+    shell_inner_area = _PI_4 * shell_inner_diameter * shell_inner_diameter
+    shell_volume = (_PI_4 * shell_diameter * shell_diameter - shell_inner_area) * tube_length
 
     # Calculate tube volume
     tube_inner_diameter = tube_outer_diameter - 2 * tube_thickness
-    tube_volume = num_tubes * math.pi * (tube_outer_diameter**2 - tube_inner_diameter**2) / 4 * tube_length
+    tube_volume = num_tubes * _PI_4 * (tube_outer_diameter * tube_outer_diameter - tube_inner_diameter * tube_inner_diameter) * tube_length
 
     # Initialize baffle weight
     baffle_weight = 0
@@ -136,8 +263,8 @@ def calculate_shelltubeexchanger_weight(shell_diameter, tube_length, tube_outer_
     # Determine if baffles are needed
     if baffle_spacing > 0 and baffle_spacing < tube_length:
         # Calculate baffle volume
-        baffle_count = math.floor(tube_length / baffle_spacing)
-        baffle_area = shell_inner_diameter * shell_inner_diameter * math.pi / 4
+        baffle_count = int(tube_length / baffle_spacing)  # positive here, so int() floors
+        baffle_area = shell_inner_area  # The baffles span the inner cross-section of the shell
         baffle_volume = baffle_area * baffle_thickness * baffle_count
 
         # Calculate baffle weight
@@ -151,3 +278,135 @@ def calculate_shelltubeexchanger_weight(shell_diameter, tube_length, tube_outer_
     total_weight = shell_weight + tube_weight + baffle_weight
 
     return total_weight, shell_weight, tube_weight
+
+
+def calculate_shelltubeexchanger_weight_vec(shell_diameter, tube_length, tube_outer_diameter, num_tubes, baffle_spacing, shell_thickness=0.0127, tube_thickness=0.00211, baffle_thickness=0.00635, shell_steel_density=7850, tube_steel_density=7850):
+    """
+    Calculates the approximate weights of a whole set of shell and tube heat exchanger designs at once.
+
+    Same as calculate_shelltubeexchanger_weight, but all parameters may be NumPy arrays (or scalars) that broadcast against each other.
+    Baffles are only counted for designs where 0 < baffle_spacing < tube_length.
+
+    Parameters:
+    shell_diameter (float or array): Diameter of the shell in meters.
+    tube_length (float or array): Length of the tubes in meters.
+    tube_outer_diameter (float or array): Outer diameter of the tubes in meters.
+    num_tubes (int or array): Number of tubes.
+    baffle_spacing (float or array): Spacing between baffles in meters.
+    shell_thickness (float or array): Thickness of the shell in meters (default is typical for carbon steel).
+    tube_thickness (float or array): Thickness of the tubes in meters (default is typical for standard carbon steel tubes).
+    baffle_thickness (float or array): Thickness of the baffles in meters (default is typical thickness).
+    shell_steel_density (float or array): Density of the shell side steel in kg/m^3 (default is 7850 for carbon steel).
+    tube_steel_density (float or array): Density of the shell side steel in kg/m^3 (default is 7850 for carbon steel).
+
+    Returns:
+    tuple of ndarray: Total, shell and tube weights of the heat exchangers in kilograms.
+    """
+    import numpy as np
+
+    baffle_spacing = np.asarray(baffle_spacing, dtype=float)
+
+    # Calculate shell volume
+    shell_inner_diameter = shell_diameter - 2 * shell_thickness
+    shell_inner_area = _PI_4 * shell_inner_diameter * shell_inner_diameter
+    shell_volume = (_PI_4 * shell_diameter * shell_diameter - shell_inner_area) * tube_length
+
+    # Calculate tube volume
+    tube_inner_diameter = tube_outer_diameter - 2 * tube_thickness
+    tube_volume = num_tubes * _PI_4 * (tube_outer_diameter * tube_outer_diameter - tube_inner_diameter * tube_inner_diameter) * tube_length
+
+    # Calculate baffle weight, zero for designs without baffles
+    has_baffles = (baffle_spacing > 0) & (baffle_spacing < tube_length)
+    baffle_count = np.floor(tube_length / np.where(has_baffles, baffle_spacing, np.inf))
+    baffle_area = shell_inner_area  # The baffles span the inner cross-section of the shell
+    baffle_weight = baffle_area * baffle_thickness * baffle_count * shell_steel_density
+
+    # Calculate weights
+    shell_weight = shell_volume * shell_steel_density  + baffle_weight
+    tube_weight = tube_volume * tube_steel_density
+
+    # Total weight
+    total_weight = shell_weight + tube_weight + baffle_weight
+
+    return total_weight, shell_weight, tube_weight
+
+
+@njit('void(f8[::1], f8[::1], f8[::1], f8[::1], f8[::1], f8, i8, f8, f8, f8, f8, f8, f8, f8[::1])', parallel=True, cache=True, nogil=True)
+def _sweep_weight_kernel(heat_transfer_area, tube_length, tube_outer_diameter, n, pitch_factor, baffle_cut_percentage, min_tubes, min_shell_diameter, shell_thickness, tube_thickness, baffle_thickness, shell_steel_density, tube_steel_density, out):
+    for i in prange(out.shape[0]):
+        length = tube_length[i]
+        d_o = tube_outer_diameter[i]
+
+        # Number of tubes, see estimate_tube_number
+        ratio = heat_transfer_area[i] / (math.pi * d_o * length)
+        num_tubes = int(ratio)
+        if num_tubes != ratio:
+            num_tubes += 1
+        if num_tubes > 1 and num_tubes < min_tubes:
+            num_tubes = min_tubes
+        if num_tubes > n[i]:
+            out[i] = math.nan  # Exceeds the maximum allowable number of tubes
+            continue
+
+        # Shell diameter, see calculate_shell_diameter
+        pitch = d_o * pitch_factor[i]
+        shell_diameter = max(math.sqrt((num_tubes * pitch * pitch) / math.pi) * 1.3, min_shell_diameter)
+
+        # Baffle spacing, see calculate_baffle_spacing
+        num_baffles = max(0, round(shell_diameter / 0.9))
+        baffle_spacing = 0.0
+        if num_baffles > 0:
+            baffle_spacing = shell_diameter / (num_baffles + (baffle_cut_percentage / 100))
+
+        # Total weight, see calculate_shelltubeexchanger_weight
+        shell_inner_diameter = shell_diameter - 2 * shell_thickness
+        shell_inner_area = _PI_4 * shell_inner_diameter * shell_inner_diameter
+        shell_volume = (_PI_4 * shell_diameter * shell_diameter - shell_inner_area) * length
+        tube_inner_diameter = d_o - 2 * tube_thickness
+        tube_volume = num_tubes * _PI_4 * (d_o * d_o - tube_inner_diameter * tube_inner_diameter) * length
+        baffle_weight = 0.0
+        if baffle_spacing > 0 and baffle_spacing < length:
+            baffle_count = int(length / baffle_spacing)
+            baffle_weight = shell_inner_area * baffle_thickness * baffle_count * shell_steel_density
+        # The baffles count towards the shell weight and again towards the total, as in calculate_shelltubeexchanger_weight
+        out[i] = shell_volume * shell_steel_density + 2 * baffle_weight + tube_volume * tube_steel_density
+
+
+def sweep_shelltubeexchanger_weight(heat_transfer_area, tube_length, tube_outer_diameter, n, baffle_cut_percentage, pitch_type='t', min_tubes=20, min_shell_diameter=0.15, shell_thickness=0.0127, tube_thickness=0.00211, baffle_thickness=0.00635, shell_steel_density=7850, tube_steel_density=7850):
+    """
+    Calculates the total weight of shell and tube heat exchangers over a grid of candidate designs in one fused pass.
+
+    For every design point the tube number, shell diameter, baffle spacing and weight are calculated as with estimate_tube_number,
+    calculate_shell_diameter, calculate_baffle_spacing and calculate_shelltubeexchanger_weight, without storing the intermediate results.
+    The design points are distributed over all CPU cores when numba is installed.
+
+    Parameters:
+    heat_transfer_area (float or array): The total required heat transfer area (m^2).
+    tube_length (float or array): Length of the tubes in meters.
+    tube_outer_diameter (float or array): Outer diameter of the tubes in meters.
+    n (int or array): Maximum allowable number of tubes.
+    baffle_cut_percentage (float): Percentage of baffle cut (%).
+    pitch_type (str or array of str): Type of pitch ('t' for triangular, 's' for square).
+    min_tubes (int): Minimum number of tubes typically needed for shell and tube heat exchangers, default is 20.
+    min_shell_diameter (float): Minimum shell diameter (in meters), default is 0.15 meters.
+    shell_thickness, tube_thickness, baffle_thickness, shell_steel_density, tube_steel_density (float): See calculate_shelltubeexchanger_weight.
+
+    Returns:
+    ndarray: Total weight of the heat exchangers in kilograms, with the broadcast shape of the array parameters.
+    NaN where the maximum allowable number of tubes is exceeded.
+    """
+    import numpy as np
+
+    pitch_type = np.asarray(pitch_type)
+    if not np.all((pitch_type == 't') | (pitch_type == 's')):
+        raise ValueError("Invalid pitch type. Use 't' for triangular or 's' for square.")
+    pitch_factor = np.where(pitch_type == 't', _PITCH_FACTORS['t'], _PITCH_FACTORS['s'])
+
+    grid = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (heat_transfer_area, tube_length, tube_outer_diameter, n, pitch_factor)))
+    shape = grid[0].shape
+    grid = [np.ascontiguousarray(x).ravel() for x in grid]
+
+    out = np.empty(grid[0].size)
+    _sweep_weight_kernel(*grid, float(baffle_cut_percentage), int(min_tubes), float(min_shell_diameter), float(shell_thickness), float(tube_thickness), float(baffle_thickness), float(shell_steel_density), float(tube_steel_density), out)
+
+    return out.reshape(shape)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+Compiled wall-thickness iterations for vertical_vessels_weight in weightvessels.py.
+
+Build in place with:
+
+    cythonize -i _thickness.pyx
+
+weightvessels.py uses the compiled solvers whenever the extension can be imported and falls back to its
+numba or pure Python solvers otherwise, with the same results and errors (e.g. ZeroDivisionError). The solvers release
+the GIL, so batch calls can run in parallel threads.
+"""
+from libc.math cimport fabs, pow
+
+
+# Same convergence settings as weightvessels.py: absolute tolerance (in), iteration cap and damping of the update
+cdef double TOLERANCE = 1e-5
+cdef int MAX_ITERATIONS = 200
+cdef double DAMPING = 0.5
+
+
+cdef double _thickness_hp(double d_in, double L_in, double allowable_stress, bint* converged) nogil:
+    cdef double tE1 = 0.25
+    cdef double tE = tE1
+    cdef double d_plus
+    cdef double L_in_sq = L_in * L_in
+    cdef int i
+    for i in range(MAX_ITERATIONS):
+        d_plus = d_in + tE1
+        tE = 0.22 * (d_plus + 18) * L_in_sq / (allowable_stress * d_plus * d_plus)
+        if fabs(tE - tE1) < TOLERANCE:
+            converged[0] = True
+            return tE
+        tE1 = tE1 + DAMPING * (tE - tE1)
+    converged[0] = False
+    return tE
+
+
+cdef double _thickness_lp(double d_in, double L_in, double E_modulus, double design_pressure, bint* converged) nogil:
+    cdef double tE1 = 0.25
+    cdef double tE = tE1
+    cdef double d_plus
+    cdef double pressure_length = design_pressure * L_in
+    cdef int i
+    for i in range(MAX_ITERATIONS):
+        d_plus = d_in + tE1
+        tE = 1.3 * d_plus * pow(pressure_length / (E_modulus * d_plus), 0.4)
+        if fabs(tE - tE1) < TOLERANCE:
+            converged[0] = True
+            return tE
+        tE1 = tE1 + DAMPING * (tE - tE1)
+    converged[0] = False
+    return tE
+
+
+def solve_thickness_hp(double d_in, double L_in, double allowable_stress):
+    """
+    Iterate the wall thickness needed to withstand wind load and earthquake for towers with an operating pressure above atmospheric.
+
+    Parameters:
+    - d_in (float): The diameter of the tower in inches (in).
+    - L_in (float): The tangent-to-tangent length of the tower in inches (in).
+    - allowable_stress (float): The maximum allowable stress of the material (psi).
+
+    Returns:
+    - tE (float): The converged wall thickness in inches (in), or the last iterate if it did not converge within MAX_ITERATIONS.
+    - converged (bool): Whether the iteration converged within MAX_ITERATIONS.
+    """
+    cdef double tE
+    cdef bint converged = False
+    with nogil:
+        tE = _thickness_hp(d_in, L_in, allowable_stress, &converged)
+    return tE, converged
+
+
+def solve_thickness_lp(double d_in, double L_in, double E_modulus, double design_pressure):
+    """
+    Iterate the wall thickness needed to withstand buckling for towers operating under vacuum.
+
+    Parameters:
+    - d_in (float): The diameter of the tower in inches (in).
+    - L_in (float): The tangent-to-tangent length of the tower in inches (in).
+    - E_modulus (float): The modulus of elasticity of the material (psi).
+    - design_pressure (float): The design pressure of the tower (psig).
+
+    Returns:
+    - tE (float): The converged wall thickness in inches (in), or the last iterate if it did not converge within MAX_ITERATIONS.
+    - converged (bool): Whether the iteration converged within MAX_ITERATIONS.
+    """
+    cdef double tE
+    cdef bint converged = False
+    with nogil:
+        tE = _thickness_lp(d_in, L_in, E_modulus, design_pressure, &converged)
+    return tE, converged
@@ -4,7 +4,105 @@ Created on Thu Jun  6 23:39:49 2024
 
 @author: Ann-Joelle
 """
-import numpy as np
+import math
+from bisect import bisect_left, bisect_right
+from functools import wraps
+
+
+def njit(*args, **kwargs):
+    """
+    Lazy version of numba.njit: numba is only imported, and the function compiled or loaded from the cache, on its
+    first call, so importing this module stays fast for callers that never use the compiled functions. The compiled
+    function then replaces the decorated one in the module namespace. numba is optional, without it the function runs
+    as plain Python.
+    """
+    def decorate(func):
+        @wraps(func)
+        def first_call(*call_args):
+            try:
+                from numba import njit
+            except ImportError:
+                compiled = func
+            else:
+                compiled = njit(*args, **kwargs)(func)
+            globals()[func.__name__] = compiled
+            return compiled(*call_args)
+        return first_call
+    return decorate
+
+
+# Design temperature breakpoints (F) of the modulus of elasticity (psi) and allowable stress (psi) correlations
+_E_MODULUS_BREAKS = (200.0, 400.0, 650.0)
+_E_MODULUS_VALUES = (30.2 * 10**6, 29.5 * 10**6, 28.3 * 10**6, 26.0 * 10**6)
+_ALLOWABLE_STRESS_BREAKS = (750.0, 800.0, 850.0, 900.0)
+_ALLOWABLE_STRESS_VALUES = (15000.0, 14750.0, 14200.0, 13100.0, math.nan)
+
+# Convergence of the wall thickness iterations: absolute tolerance (in), iteration cap and damping of the update.
+# For slender towers the undamped high-pressure step oscillates around the solution with a slope close to -1,
+# averaging the old and new iterate removes most of that oscillation.
+_TOLERANCE = 1e-5
+_MAX_ITERATIONS = 200
+_DAMPING = 0.5
+
+
+# Prefer the compiled solvers of the Cython extension (see _thickness.pyx) when it has been built, they use the same
+# convergence settings and return the same (tE, converged) results and errors. The numba solvers are only defined and
+# compiled when it is not available.
+try:
+    from _thickness import solve_thickness_hp as _solve_thickness_hp, solve_thickness_lp as _solve_thickness_lp
+except ImportError:
+    @njit('Tuple((f8, b1))(f8, f8, f8)', cache=True, nogil=True)
+    def _solve_thickness_hp(d_in, L_in, allowable_stress):
+        """
+        Iterate the wall thickness needed to withstand wind load and earthquake for towers with an operating pressure above atmospheric.
+
+        Parameters:
+        - d_in (float): The diameter of the tower in inches (in).
+        - L_in (float): The tangent-to-tangent length of the tower in inches (in).
+        - allowable_stress (float): The maximum allowable stress of the material (psi).
+
+        Returns:
+        - tE (float): The converged wall thickness in inches (in), or the last iterate if it did not converge within _MAX_ITERATIONS.
+        - converged (bool): Whether the iteration converged within _MAX_ITERATIONS.
+        """
+        tE1 = 0.25
+        tE = tE1
+        L_in_sq = L_in * L_in
+        for _ in range(_MAX_ITERATIONS):
+            d_plus = d_in + tE1
+            tE = 0.22 * (d_plus + 18) * L_in_sq / (allowable_stress * d_plus * d_plus)
+            if abs(tE - tE1) < _TOLERANCE:
+                return tE, True
+            tE1 = tE1 + _DAMPING * (tE - tE1)
+        return tE, False
+
+
+    @njit('Tuple((f8, b1))(f8, f8, f8, f8)', cache=True, nogil=True)
+    def _solve_thickness_lp(d_in, L_in, E_modulus, design_pressure):
+        """
+        Iterate the wall thickness needed to withstand buckling for towers operating under vacuum.
+
+        Parameters:
+        - d_in (float): The diameter of the tower in inches (in).
+        - L_in (float): The tangent-to-tangent length of the tower in inches (in).
+        - E_modulus (float): The modulus of elasticity of the material (psi).
+        - design_pressure (float): The design pressure of the tower (psig).
+
+        Returns:
+        - tE (float): The converged wall thickness in inches (in), or the last iterate if it did not converge within _MAX_ITERATIONS.
+        - converged (bool): Whether the iteration converged within _MAX_ITERATIONS.
+        """
+        tE1 = 0.25
+        tE = tE1
+        pressure_length = design_pressure * L_in
+        for _ in range(_MAX_ITERATIONS):
+            d_plus = d_in + tE1
+            tE = 1.3 * d_plus * (pressure_length / (E_modulus * d_plus))**0.4
+            if abs(tE - tE1) < _TOLERANCE:
+                return tE, True
+            tE1 = tE1 + _DAMPING * (tE - tE1)
+        return tE, False
+
 
 def vertical_vessels_weight(lowest_pressure, highest_temp, diameter, tangent_tangent_length, material_density):
     """
@@ -34,13 +132,17 @@ def vertical_vessels_weight(lowest_pressure, highest_temp, diameter, tangent_tan
     m_to_inch = 39.3701
     kPa_to_psig = 0.145038
     kg_to_lb = 2.20462
-    kPa_to_psig = 0.145038
+
+    # Convert the vessel dimensions to inches once
+    d_in = diameter * m_to_inch
+    L_in = tangent_tangent_length * m_to_inch
     
     # Calculate design pressure based on lowest pressure
     if lowest_pressure <= 34.5: # in kPa
         design_pressure = 10.0 # in psig
     elif lowest_pressure <= 6895:
-        design_pressure = np.exp(0.60608 + 0.91615 * np.log(lowest_pressure*kPa_to_psig) + 0.0015655*(np.log(lowest_pressure*kPa_to_psig))**2)
+        lp_log = math.log(lowest_pressure*kPa_to_psig)
+        design_pressure = math.exp(0.60608 + 0.91615 * lp_log + 0.0015655 * lp_log * lp_log)
     elif lowest_pressure >= 6895:
         design_pressure = 1.1 * lowest_pressure*kPa_to_psig
 
@@ -48,61 +150,135 @@ def vertical_vessels_weight(lowest_pressure, highest_temp, diameter, tangent_tan
     # Convert highest temperature from Kelvin to Fahrenheit and adjust
     design_temp = (highest_temp - 273.15) * 9/5 + 32.0 + 50.0 # in Fahrenheit
     
-    # Determine modulus of elasticity based on design temperature
-    if design_temp < 200.0:
-        E_modulus = 30.2 * 10**6
-    elif design_temp < 400.0:
-        E_modulus = 29.5 * 10**6
-    elif design_temp < 650.0:
-        E_modulus = 28.3 * 10**6
-    else:
-        E_modulus = 26.0 * 10**6
+    # Determine modulus of elasticity based on design temperature (upper bounds exclusive)
+    E_modulus = _E_MODULUS_VALUES[bisect_right(_E_MODULUS_BREAKS, design_temp)]
     
-    # Set allowable stress based on design temperature
-    if design_temp <= 750:
-        allowable_stress = 15000
-    elif design_temp <= 800:
-        allowable_stress = 14750
-    elif design_temp <= 850:
-        allowable_stress = 14200
-    elif design_temp <= 900:
-        allowable_stress = 13100
-    else:
+    # Set allowable stress based on design temperature (upper bounds inclusive), NaN above 900 F
+    allowable_stress = _ALLOWABLE_STRESS_VALUES[bisect_left(_ALLOWABLE_STRESS_BREAKS, design_temp)]
+    if design_temp > 900:
         print("Warning: Distillation design temperature is too high for wall thickness calculation")
     
-    # Initial thickness guesses and error tolerance for iteration
-    tE1 = 0.25
-    error = 1
-    
     # Wall thickness calculations
     if lowest_pressure >= 101:
-        while abs(error) > 0.001:
-            tE = 0.22 * (((diameter * m_to_inch) + tE1) + 18) * (tangent_tangent_length * m_to_inch)**2 / (allowable_stress * ((diameter * m_to_inch) + tE1)**2)
-            error = (tE1 - tE) / tE1
-            tE1 = tE
-        tp = (design_pressure * (diameter * m_to_inch)) / (2 * allowable_stress - 1.2 * design_pressure)
+        tE, converged = _solve_thickness_hp(d_in, L_in, allowable_stress)
+        tp = (design_pressure * d_in) / (2 * allowable_stress - 1.2 * design_pressure)
         t_total = (tp + tE + tp) / 2
     elif lowest_pressure <= 101:
-        while abs(error) > 0.001:
-            tE = 1.3 * ((diameter * m_to_inch) + tE1) * ((design_pressure * (tangent_tangent_length * m_to_inch)) / (E_modulus * ((diameter * m_to_inch) + tE1)))**0.4
-            error = (tE1 - tE) / tE1
-            tE1 = tE
-        check = tE / (diameter * m_to_inch)
+        tE, converged = _solve_thickness_lp(d_in, L_in, E_modulus, design_pressure)
+        check = tE / d_in
         if check >= 0.05:
             print("Warning: The wall thickness does not pass the methods.")
-        tEC = (tangent_tangent_length * m_to_inch) * (0.18 * (diameter * m_to_inch) - 2.2) * 10**(-5) - 0.19
+        tEC = L_in * (0.18 * d_in - 2.2) * 10**(-5) - 0.19
         if tEC > 0:
             t_total = tEC + tE + 0.125  # Adding corrosive allowance
         else:
             t_total = tE + 0.125  # Adding corrosive allowance
 
+    if not converged:
+        print("Warning: The wall thickness iteration did not converge, the weight may be inaccurate.")
+
     # Ensure minimum wall thickness
     if t_total < 0.25:
         t_total = 0.25
     
     # Calculate total weight
-    weight = np.pi * t_total * (material_density * kg_m3_to_lb_in3) * ((diameter * m_to_inch) + t_total) * ((tangent_tangent_length * m_to_inch) + 0.8 * (diameter * m_to_inch))
+    weight = math.pi * t_total * (material_density * kg_m3_to_lb_in3) * (d_in + t_total) * (L_in + 0.8 * d_in)
     
     weight = weight / kg_to_lb
     
     return weight
+
+
+def vertical_vessels_weight_vec(lowest_pressure, highest_temp, diameter, tangent_tangent_length, material_density):
+    """
+    Calculate the weights of a batch of vertical chemical processing vessels, e.g. for parametric studies over diameter and length grids.
+
+    The calculation follows vertical_vessels_weight, but all inputs may be NumPy arrays (or scalars) that broadcast against each other. The
+    piecewise correlations are evaluated with np.select and lookup tables and the wall thickness is iterated for all vessels at once, with the same
+    damping, tolerance and iteration cap as vertical_vessels_weight, until every vessel has converged. No Python loop over the vessels is needed.
+
+    Parameters:
+    - lowest_pressure (float or array): The minimum operating pressure of the tower in kilopascals (kPa).
+    - highest_temp (float or array): The maximum operating temperature of the tower in Kelvin (K).
+    - diameter (float or array): The diameter of the tower in meters (m).
+    - tangent_tangent_length (float or array): The tangent-to-tangent length of the tower in meters (m).
+    - material_density (float or array): The density of the material used to construct the tower in kilograms per cubic meter (kg/m3).
+
+    Returns:
+    - weight (ndarray): The calculated weights of the towers, with the broadcast shape of the inputs. Towers with a design temperature above 900 F and
+      towers whose wall thickness iteration did not converge are returned as NaN.
+
+    Raises:
+    - Warning messages are printed if any of the vessels is out of the typical range for chemical processing equipment design.
+    """
+    import numpy as np
+
+    lowest_pressure, highest_temp, diameter, tangent_tangent_length, material_density = np.broadcast_arrays(
+        *(np.asarray(x, dtype=float) for x in (lowest_pressure, highest_temp, diameter, tangent_tangent_length, material_density)))
+
+    # Constants for unit conversions
+    kg_m3_to_lb_in3 = 0.000036127298147753
+    m_to_inch = 39.3701
+    kPa_to_psig = 0.145038
+    kg_to_lb = 2.20462
+
+    # Calculate design pressure based on lowest pressure
+    lp_log = np.log(np.maximum(lowest_pressure, 34.5) * kPa_to_psig)
+    design_pressure = np.select(
+        [lowest_pressure <= 34.5, lowest_pressure <= 6895],
+        [10.0, np.exp(0.60608 + 0.91615 * lp_log + 0.0015655 * lp_log * lp_log)],
+        1.1 * lowest_pressure * kPa_to_psig)
+
+    # Convert highest temperature from Kelvin to Fahrenheit and adjust
+    design_temp = (highest_temp - 273.15) * 9/5 + 32.0 + 50.0 # in Fahrenheit
+
+    # Determine modulus of elasticity based on design temperature (upper bounds exclusive)
+    E_modulus = np.take(_E_MODULUS_VALUES, np.searchsorted(_E_MODULUS_BREAKS, design_temp, side='right'))
+
+    # Set allowable stress based on design temperature (upper bounds inclusive)
+    allowable_stress = np.take(_ALLOWABLE_STRESS_VALUES, np.searchsorted(_ALLOWABLE_STRESS_BREAKS, design_temp, side='left'))
+    if np.any(design_temp > 900):
+        print("Warning: Distillation design temperature is too high for wall thickness calculation")
+
+    # Wall thickness calculations, each vessel iterates the correlation of its pressure range
+    d_in = diameter * m_to_inch
+    L_in = tangent_tangent_length * m_to_inch
+    L_in_sq = L_in * L_in
+    pressure_length = design_pressure * L_in
+    high_pressure = lowest_pressure >= 101
+    tE1 = np.full_like(d_in, 0.25)
+    for _ in range(_MAX_ITERATIONS):
+        d_plus = d_in + tE1
+        tE = np.where(high_pressure,
+                      0.22 * (d_plus + 18) * L_in_sq / (allowable_stress * d_plus * d_plus),
+                      1.3 * d_plus * (pressure_length / (E_modulus * d_plus))**0.4)
+        converged = np.abs(tE - tE1) < _TOLERANCE
+        if np.all(converged | np.isnan(tE)):
+            break
+        tE1 = tE1 + _DAMPING * (tE - tE1)
+    # NaN inputs never converge and are reported here too, towers that are too hot already have their own warning
+    if np.any(~converged & ~np.isnan(allowable_stress)):
+        print("Warning: The wall thickness iteration did not converge for some vessels, their weight is returned as NaN.")
+
+    tp = (design_pressure * d_in) / (2 * allowable_stress - 1.2 * design_pressure)
+    t_total_hp = (tp + tE + tp) / 2
+
+    if np.any(~high_pressure & (tE / d_in >= 0.05)):
+        print("Warning: The wall thickness does not pass the methods.")
+    tEC = L_in * (0.18 * d_in - 2.2) * 10**(-5) - 0.19
+    t_total_lp = np.maximum(tEC, 0.0) + tE + 0.125  # Adding corrosive allowance
+
+    t_total = np.where(high_pressure, t_total_hp, t_total_lp)
+
+    # Ensure minimum wall thickness
+    t_total = np.maximum(t_total, 0.25)
+
+    # Calculate total weight
+    weight = np.pi * t_total * (material_density * kg_m3_to_lb_in3) * (d_in + t_total) * (L_in + 0.8 * d_in)
+
+    weight = weight / kg_to_lb
+
+    # Vessels that cannot be sized
+    weight = np.where(converged & ~np.isnan(allowable_stress), weight, np.nan)
+
+    return weight